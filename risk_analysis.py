@@ -12,17 +12,20 @@ This script:
 """
 
 import re
+import numpy as np
 import pandas as pd
-from dataclasses import dataclass
-from typing import List, Dict
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import chain, islice
+from multiprocessing import Pool, cpu_count
+from typing import List, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
 
 
 # ============================================================
 # Data structures
 # ============================================================
 
-@dataclass
-class ConversationRiskResult:
+class ConversationRiskResult(NamedTuple):
     conversation_id: int
     hiv_risk_score: float
     hiv_risk_level: str
@@ -36,11 +39,27 @@ class ConversationRiskResult:
 # Load and parse conversations
 # ============================================================
 
-def load_conversations(path: str) -> List[str]:
-    """Load conversations from a TXT file and split by separator."""
-    with open(path, "r", encoding="utf-8") as f:
-        raw = f.read()
-    return [c.strip() for c in raw.split("========== Conversation ==========") if c.strip()]
+CONVERSATION_SEPARATOR = "========== Conversation =========="
+
+
+def load_conversations(path: str, chunk_size: int = 1 << 20) -> Iterator[str]:
+    """Stream conversations from a TXT file, splitting on the separator.
+
+    The file is read in `chunk_size` pieces and only the trailing partial
+    conversation is kept between reads, so the whole file is never held
+    in memory at once.
+    """
+    with open(path, "r", encoding="utf-8", buffering=chunk_size) as f:
+        buffer = ""
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            *complete, buffer = (buffer + chunk).split(CONVERSATION_SEPARATOR)
+            for c in complete:
+                c = c.strip()
+                if c:
+                    yield c
+        buffer = buffer.strip()
+        if buffer:
+            yield buffer
 
 
 def extract_user_text(conversation: str) -> str:
@@ -148,77 +167,162 @@ MH_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
 # Scoring functions
 # ============================================================
 
-def _keyword_score(text: str, keyword_dict: Dict[str, Dict[str, List[str]]]) -> float:
-    score = 0.0
-    text = text.lower()
+# Lower bounds of the "moderate" and "high" bands
+RISK_THRESHOLDS = (0.3, 0.6)
+RISK_LEVELS = ("low", "moderate", "high")
+
+
+_REGEX_CHARS = frozenset(r".^$*+?{}[]\|()")
+
+# (weight, literal phrases, residual regex or None) per category
+CompiledKeywords = List[Tuple[float, Tuple[str, ...], Optional[re.Pattern]]]
+
+
+def _compile(keyword_dict: Dict[str, Dict[str, List[str]]]) -> CompiledKeywords:
+    """Split each category into plain literals and one alternation of the rest.
 
-    for _, cfg in keyword_dict.items():
-        if any(re.search(pat, text) for pat in cfg["patterns"]):
-            score += cfg["weight"]
+    Literals are matched with substring search on lowercased text, which is
+    much cheaper than running them through the regex engine.
+    """
+    compiled = []
+    for cfg in keyword_dict.values():
+        literals = tuple(p for p in cfg["patterns"] if not _REGEX_CHARS.intersection(p))
+        regexes = [p for p in cfg["patterns"] if _REGEX_CHARS.intersection(p)]
+        residual = re.compile("(?:" + "|".join(regexes) + ")") if regexes else None
+        compiled.append((cfg["weight"], literals, residual))
+    return compiled
 
-    return min(score, 1.0)
+
+_HIV_COMPILED = _compile(HIV_KEYWORDS)
+_MH_COMPILED = _compile(MH_KEYWORDS)
+
+
+def _keyword_score(text: str, compiled: CompiledKeywords) -> float:
+    """Score already-lowercased text against compiled keyword categories."""
+    score = 0.0
+
+    for weight, literals, residual in compiled:
+        if any(lit in text for lit in literals) or (residual is not None and residual.search(text)):
+            score += weight
+            if score >= 1.0:
+                return 1.0  # the score is clipped, so the rest can't change it
+
+    return score
+
+
+def _vectorized_score(lowered: pd.Series, compiled: CompiledKeywords) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (scores, level codes) for a Series of lowercased user texts.
+
+    Regex and substring matching stay in pandas and produce one boolean
+    hit array per category. Weighting, clipping and bucketing are then
+    done as array operations.
+    """
+    # Sum in dictionary order, so float rounding near the 0.3/0.6 thresholds
+    # is the same as adding the hit weights one by one
+    score = np.zeros(len(lowered))
+    for weight, literals, residual in compiled:
+        hit = np.zeros(len(lowered), dtype=bool)
+        for lit in literals:
+            hit |= lowered.str.contains(lit, regex=False).to_numpy()
+        if residual is not None:
+            # Rows already at the 1.0 cap don't need the regex pass
+            candidates = ~hit & (score < 1.0)
+            if candidates.any():
+                matched = lowered[candidates].map(lambda t: residual.search(t) is not None)
+                hit[candidates] = matched.to_numpy(dtype=bool)
+        score += hit * weight
+    np.minimum(score, 1.0, out=score)
+
+    codes = np.searchsorted(RISK_THRESHOLDS, score, side="right").astype(np.int8)
+    return score, codes
+
+
+def _check_scorer_parity() -> None:
+    """Check _keyword_score() and _vectorized_score() agree on the keyword phrases.
+
+    Each literal phrase is scored alone, and every combination of categories
+    is scored using each category's first phrase, so weight sums and the
+    1.0 cap are covered too.
+    """
+    for compiled in (_HIV_COMPILED, _MH_COMPILED):
+        firsts = [literals[0] for _, literals, _ in compiled if literals]
+        texts = [""] + [lit for _, literals, _ in compiled for lit in literals]
+        texts += [
+            " ".join(p for bit, p in enumerate(firsts) if mask >> bit & 1)
+            for mask in range(1, 1 << len(firsts))
+        ]
+        batch, _ = _vectorized_score(pd.Series(texts), compiled)
+        for text, expected in zip(texts, batch):
+            if _keyword_score(text, compiled) != expected:
+                raise RuntimeError(f"scalar and batch keyword scores disagree on {text!r}")
+
+
+_COMPILED_BY_NAME = {"hiv": _HIV_COMPILED, "mh": _MH_COMPILED}
+
+
+@lru_cache(maxsize=8192)
+def _score_cached(text: str, which: str) -> float:
+    """Memoised _keyword_score(); empty or repeated user texts are common."""
+    return _keyword_score(text, _COMPILED_BY_NAME[which])
 
 
 def compute_hiv_risk(text: str) -> float:
-    return _keyword_score(text, HIV_KEYWORDS)
+    return _score_cached(text.lower(), "hiv")
 
 
 def compute_mental_health_risk(text: str) -> float:
-    return _keyword_score(text, MH_KEYWORDS)
+    return _score_cached(text.lower(), "mh")
 
 
 def risk_level(score: float) -> str:
-    if score < 0.3:
-        return "low"
-    elif score < 0.6:
-        return "moderate"
-    return "high"
+    return RISK_LEVELS[bisect_right(RISK_THRESHOLDS, score)]
 
 
 # ============================================================
 # Recommendations
 # ============================================================
 
-def generate_hiv_recommendation(score: float) -> str:
-    level = risk_level(score)
-
-    if level == "low":
-        return (
-            "HIV risk low. Recommend routine HIV testing, consistent condom use, "
-            "and STI prevention."
-        )
-
-    if level == "moderate":
-        return (
-            "Moderate HIV risk. Recommend prompt HIV testing, STI screening, and "
-            "assessment for PEP if exposure was within 72 hours."
-        )
-
-    return (
+HIV_RECOMMENDATIONS: Dict[str, str] = {
+    "low": (
+        "HIV risk low. Recommend routine HIV testing, consistent condom use, "
+        "and STI prevention."
+    ),
+    "moderate": (
+        "Moderate HIV risk. Recommend prompt HIV testing, STI screening, and "
+        "assessment for PEP if exposure was within 72 hours."
+    ),
+    "high": (
         "High HIV risk. Immediate clinical assessment advised. Evaluate for PEP, "
         "STI screening, pregnancy screening if applicable, and urgent HIV testing."
-    )
+    ),
+}
 
+MH_RECOMMENDATIONS: Dict[str, str] = {
+    "low": (
+        "Low mental health risk. Provide psychoeducation, stress management, "
+        "and routine monitoring."
+    ),
+    "moderate": (
+        "Moderate mental health risk. Recommend clinic-based mental health "
+        "assessment and counselling support."
+    ),
+    "high": (
+        "High mental health risk. Urgent same-day mental health assessment advised, "
+        "including screening for suicidality or self-harm."
+    ),
+}
 
-def generate_mental_health_recommendation(score: float) -> str:
-    level = risk_level(score)
 
-    if level == "low":
-        return (
-            "Low mental health risk. Provide psychoeducation, stress management, "
-            "and routine monitoring."
-        )
+_HIV_REC_CATEGORIES = [HIV_RECOMMENDATIONS[level] for level in RISK_LEVELS]
+_MH_REC_CATEGORIES = [MH_RECOMMENDATIONS[level] for level in RISK_LEVELS]
 
-    if level == "moderate":
-        return (
-            "Moderate mental health risk. Recommend clinic-based mental health "
-            "assessment and counselling support."
-        )
 
-    return (
-        "High mental health risk. Urgent same-day mental health assessment advised, "
-        "including screening for suicidality or self-harm."
-    )
+def generate_hiv_recommendation(score: float) -> str:
+    return HIV_RECOMMENDATIONS[risk_level(score)]
+
+
+def generate_mental_health_recommendation(score: float) -> str:
+    return MH_RECOMMENDATIONS[risk_level(score)]
 
 
 # ============================================================
@@ -226,45 +330,91 @@ def generate_mental_health_recommendation(score: float) -> str:
 # ============================================================
 
 def analyse_conversation(conversation_id: int, conversation_text: str) -> ConversationRiskResult:
-    user_text = extract_user_text(conversation_text)
+    # Lowercase once and score both dictionaries against the same copy
+    user_text = extract_user_text(conversation_text).lower()
 
-    hiv_score = compute_hiv_risk(user_text)
-    mh_score = compute_mental_health_risk(user_text)
+    hiv_score = _score_cached(user_text, "hiv")
+    mh_score = _score_cached(user_text, "mh")
+    hiv_level = risk_level(hiv_score)
+    mh_level = risk_level(mh_score)
 
     return ConversationRiskResult(
         conversation_id=conversation_id,
         hiv_risk_score=round(hiv_score, 2),
-        hiv_risk_level=risk_level(hiv_score),
+        hiv_risk_level=hiv_level,
         mental_health_risk_score=round(mh_score, 2),
-        mental_health_risk_level=risk_level(mh_score),
-        hiv_recommendation=generate_hiv_recommendation(hiv_score),
-        mental_health_recommendation=generate_mental_health_recommendation(mh_score),
+        mental_health_risk_level=mh_level,
+        hiv_recommendation=HIV_RECOMMENDATIONS[hiv_level],
+        mental_health_recommendation=MH_RECOMMENDATIONS[mh_level],
     )
 
 
+def analyse_conversations(conversations: List[str], start_id: int = 0) -> pd.DataFrame:
+    """Vectorised equivalent of analyse_conversation() over a whole corpus."""
+    ids = range(start_id, start_id + len(conversations))
+    lowered = pd.Series([extract_user_text(c) for c in conversations]).str.lower()
+
+    # Score each distinct user text once, then broadcast back to the rows
+    inverse, uniques = pd.factorize(lowered)
+    uniques = pd.Series(uniques)
+    hiv_score, hiv_codes = (a[inverse] for a in _vectorized_score(uniques, _HIV_COMPILED))
+    mh_score, mh_codes = (a[inverse] for a in _vectorized_score(uniques, _MH_COMPILED))
+
+    # Three distinct values per column, so keep int8 codes and let to_csv
+    # write out the labels
+    return pd.DataFrame({
+        "conversation_id": ids,
+        "hiv_risk_score": hiv_score.round(2),
+        "hiv_risk_level": pd.Categorical.from_codes(hiv_codes, categories=RISK_LEVELS),
+        "mental_health_risk_score": mh_score.round(2),
+        "mental_health_risk_level": pd.Categorical.from_codes(mh_codes, categories=RISK_LEVELS),
+        "hiv_recommendation": pd.Categorical.from_codes(hiv_codes, categories=_HIV_REC_CATEGORIES),
+        "mental_health_recommendation": pd.Categorical.from_codes(mh_codes, categories=_MH_REC_CATEGORIES),
+    }, index=ids)
+
+
+def _chunks(conversations: Iterable[str], size: int) -> Iterator[Tuple[int, List[str]]]:
+    """Yield (start_id, batch) pairs of at most `size` conversations."""
+    it = iter(conversations)
+    start = 0
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield start, batch
+        start += len(batch)
+
+
+def _analyse_chunk(chunk: Tuple[int, List[str]]) -> pd.DataFrame:
+    start_id, batch = chunk
+    return analyse_conversations(batch, start_id)
+
+
+def _analyse_chunks(chunks: Iterator[Tuple[int, List[str]]]) -> Iterator[pd.DataFrame]:
+    """Score chunks in order, using a worker pool only when it can pay off."""
+    head = list(islice(chunks, 2))
+    chunks = chain(head, chunks)
+    if len(head) < 2 or cpu_count() == 1:
+        yield from map(_analyse_chunk, chunks)
+        return
+    with Pool() as pool:
+        yield from pool.imap(_analyse_chunk, chunks)
+
+
 # ============================================================
 # MAIN PIPELINE
 # ============================================================
 
 if __name__ == "__main__":
     DATA_PATH = "health_ai_whatsapp_100_conversations_long.txt"  # local path
+    CHUNK_SIZE = 4096  # conversations per batch (and per worker task)
+
+    _check_scorer_parity()
 
-    conversations = load_conversations(DATA_PATH)
-
-    results = []
-    for idx, conv in enumerate(conversations):
-        out = analyse_conversation(idx, conv)
-        results.append({
-            "conversation_id": out.conversation_id,
-            "hiv_risk_score": out.hiv_risk_score,
-            "hiv_risk_level": out.hiv_risk_level,
-            "mental_health_risk_score": out.mental_health_risk_score,
-            "mental_health_risk_level": out.mental_health_risk_level,
-            "hiv_recommendation": out.hiv_recommendation,
-            "mental_health_recommendation": out.mental_health_recommendation,
-        })
-
-    df = pd.DataFrame(results)
-    df.to_csv("conversation_risk_results.csv", index=False)
+    # Append each chunk's rows as it arrives instead of concatenating the corpus
+    with open("conversation_risk_results.csv", "w", encoding="utf-8", newline="") as f:
+        chunks = _chunks(load_conversations(DATA_PATH), CHUNK_SIZE)
+        for i, frame in enumerate(_analyse_chunks(chunks)):
+            frame.to_csv(f, header=i == 0, index=False)
 
     print("Analysis complete. Saved to conversation_risk_results.csv")